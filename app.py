@@ -1,6 +1,5 @@
 import streamlit as st
 import polars as pl
-import pandas as pd
 import io
 import plotly.express as px
 from pygwalker.api.streamlit import init_streamlit_comm, StreamlitRenderer
@@ -10,20 +9,25 @@ import plotly.graph_objects as go
 # Silence Streamlit deprecated user warning
 streamlit.user_info.maybe_show_deprecated_user_warning = lambda: None
 
+VALIDATION_STATES = ["VALID", "INVALID", "NOT IN NMS"]
 
-def validate_csv(uploaded_file, required_cols):
+
+def validate_csv(uploaded_file, required_cols, schema_overrides=None):
     """Validate uploaded CSV file and check required columns."""
     if not uploaded_file.name.lower().endswith(".csv"):
         raise ValueError(f"{uploaded_file.name} is not a valid .csv file.")
 
-    df = pl.read_csv(uploaded_file).lazy()
-    trimmed_names = {col: col.strip() for col in df.collect_schema().names()}
-    df = df.rename(trimmed_names)
+    # Header names are stripped before schema_overrides are matched against them
+    df = pl.scan_csv(
+        io.BytesIO(uploaded_file.getvalue()),
+        with_column_names=lambda cols: [col.strip() for col in cols],
+        schema_overrides=schema_overrides,
+        rechunk=False
+    )
 
 
     col_names = [c.lower().strip() for c in df.collect_schema().names()]
     missing_cols = [col for col in required_cols if col.lower() not in col_names]
-    print(df.collect_schema().names())
     if missing_cols:
         raise ValueError(f"❌ Missing required columns: {', '.join(missing_cols)}")
 
@@ -33,7 +37,11 @@ def validate_csv(uploaded_file, required_cols):
 def process_tickets(daily_file, tickets_file):
 
     daily_tickets = validate_csv(daily_file, ['short_description', 'ALARMS'])
-    tickets = validate_csv(tickets_file, ['Notification ID', 'Controlling Object Name', 'Alarm Time', 'Alarm Text'])
+    tickets = validate_csv(
+        tickets_file,
+        ['Notification ID', 'Controlling Object Name', 'Alarm Time', 'Alarm Text'],
+        schema_overrides={'Alarm Time': pl.Datetime('us')}
+    )
 
 
     daily_tickets = daily_tickets.with_columns(
@@ -46,60 +54,145 @@ def process_tickets(daily_file, tickets_file):
     spliced = tickets.select([
         pl.col('Notification ID'),
         pl.col('Controlling Object Name').str.strip_chars().alias('site_code'),
-        pl.col('Alarm Time').str.strptime(pl.Datetime, '%Y-%m-%d %H:%M:%S').alias('START TIME'),
+        pl.col('Alarm Time').alias('START TIME'),
         pl.col('Alarm Text')
     ])
 
     grouped = (
-        spliced.sort('START TIME', descending=True)
-        .group_by('site_code')
+        spliced.group_by('site_code')
         .agg([
-            pl.col('Alarm Text').first(),
-            pl.col('START TIME').first(),
-            pl.col('Notification ID').first()
+            pl.struct('Alarm Text', 'START TIME', 'Notification ID')
+            .sort_by('START TIME', descending=True, nulls_last=True)
+            .first()
+            .alias('latest')
         ])
+        .unnest('latest')
     )
 
-    merged = daily_tickets.join(grouped, on='site_code', how='left')
+    merged = daily_tickets.join(grouped, on='site_code', how='left', maintain_order='left')
 
     merged = merged.with_columns([
         pl.when(pl.col('Alarm Text').is_null())
         .then(pl.lit('NOT IN NMS'))
-        .when(pl.col('Alarm Text').fill_null('').str.contains('NE3SWS AGENT NOT RESPONDING TO REQUESTS'))
+        .when(pl.col('Alarm Text').fill_null('').str.contains('NE3SWS AGENT NOT RESPONDING TO REQUESTS', literal=True))
         .then(pl.lit('VALID'))
         .otherwise(pl.lit('INVALID'))
+        .cast(pl.Enum(VALIDATION_STATES))
         .alias('VALIDATION')
     ])
 
-    merged = merged.with_columns([
+    final_set = merged.select([
+        'number', 'opened_at', 'short_description', 'sys_updated_on',
+        'ALARMS', 'VALIDATION',
         pl.when(pl.col('VALIDATION') == 'INVALID')
         .then(None)
         .otherwise(pl.col('START TIME'))
         .alias('START TIME'),
-        pl.col('site_code').alias('SITE CODE')
+        pl.col('site_code').alias('SITE CODE'),
+        'Notification ID'
+    ]).collect(engine='streaming')
+
+    return final_set
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def process_tickets_cached(daily_name, daily_bytes, tickets_name, tickets_bytes):
+    """Memoize process_tickets on the uploaded file contents."""
+    daily_file = io.BytesIO(daily_bytes)
+    daily_file.name = daily_name
+    tickets_file = io.BytesIO(tickets_bytes)
+    tickets_file.name = tickets_name
+    return process_tickets(daily_file, tickets_file)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_pie(values, dark_mode):
+    """Build the validation pie chart for the given state counts."""
+    text_color = "white" if dark_mode else "black"
+    bg_color = "black" if dark_mode else "white"
+
+    order = VALIDATION_STATES
+
+    fig = px.pie(
+        names=order,
+        values=values,
+        hole=0,
+        color=order,
+        color_discrete_map={
+            "VALID": "green",
+            "INVALID": "orange",
+            "NOT IN NMS": "blue"
+        }
+    )
+
+    fig.update_traces(
+        textinfo="label+percent",
+        textposition="inside",
+        insidetextfont=dict(size=14, color="white"),
+        hoverinfo="skip",
+        hovertemplate=None
+    )
+
+    fig.update_layout(
+        title=dict(
+            text="Validation Distribution",
+            x=0.5, y=0.95,
+            xanchor="center",
+            yanchor="top",
+            font=dict(size=30, color=text_color, family="Arial")
+        ),
+        autosize=True,
+        height=560,
+        margin=dict(t=140, b=40, l=10, r=40),
+        legend=dict(orientation="v", y=1, x=0.61, xanchor="left", font=dict(color=text_color)
+
+        ),
+        paper_bgcolor=bg_color,
+        plot_bgcolor=bg_color
+
+    )
+
+    for ann in fig.layout.annotations:
+        ann.font.color = text_color
+
+    fig.update_layout(annotations=[
+        dict(text=f"<span style='font-size:23px;'><b>VALID</b></span><br><br><span style='font-size:40px;'>{values[0]}</span>",
+             x=0.25, y=1.22, xref="paper", yref="paper",
+             showarrow=False, align="center", font=dict(size=16, color=text_color)),
+        dict(text=f"<span style='font-size:23px;'><b>INVALID</b></span><br><br><span style='font-size:40px;'>{values[1]}</span>",
+             x=0.50, y=1.22, xref="paper", yref="paper",
+             showarrow=False, align="center", font=dict(size=16, color=text_color)),
+        dict(text=f"<span style='font-size:23px;'><b>NOT IN NMS</b></span><br><br><span style='font-size:40px;'>{values[2]}</span>",
+             x=0.75, y=1.22, xref="paper", yref="paper",
+             showarrow=False, align="center", font=dict(size=16, color=text_color)),
     ])
 
-    final_set = merged.select([
-        'number', 'opened_at', 'short_description', 'sys_updated_on',
-        'ALARMS', 'VALIDATION', 'START TIME', 'SITE CODE', 'Notification ID'
-    ]).collect()
+    return fig
 
-    return final_set.to_pandas()
+
+def clear_search_query():
+    st.session_state.search_query = ""
 
 
 def get_unique(df):
-    df = pl.from_pandas(df)
-    grouped = (
+    return (
             df.lazy().group_by('SITE CODE')
             .agg(pl.len().alias('Alarm Count'))
             .sort('Alarm Count', descending=True)
     ).collect()
-    return grouped.to_pandas()
+
+def get_validation_counts(df):
+    grouped = df.group_by('VALIDATION').agg(pl.len().alias('n')).to_dict(as_series=False)
+    return dict(zip(grouped['VALIDATION'], grouped['n']))
+
+def get_excel_bytes(df):
+    output = io.BytesIO()
+    df.write_excel(workbook=output, worksheet='Validated Tickets')
+    return output.getvalue()
 
 def get_valid(df):
-	df = pl.from_pandas(df)
 	filtered = df.lazy().filter(pl.col('VALIDATION') == 'VALID').collect()
-	return filtered.to_pandas()
+	return filtered
 
 def main():
     st.set_page_config(page_title="Ticket Validator", layout="wide")
@@ -160,32 +253,40 @@ def main():
         st.info("Please upload **both** CSV files to proceed.")
         st.stop()
 
-    if 'df_pandas' not in st.session_state:
+    data_key = (daily_file.file_id, tickets_file.file_id)
+    if st.session_state.get('data_key') != data_key:
         try:
             st.info("Processing data, please wait...")
-            st.session_state.df_pandas = process_tickets(daily_file, tickets_file)
+            st.session_state.df_polars = process_tickets_cached(
+                daily_file.name, daily_file.getvalue(),
+                tickets_file.name, tickets_file.getvalue()
+            )
+            st.session_state.validation_counts = get_validation_counts(st.session_state.df_polars)
+            st.session_state.tabular_pl = get_unique(st.session_state.df_polars).with_columns(
+                pl.col('SITE CODE').str.to_lowercase().alias('_site_lc'),
+                pl.col('Alarm Count').cast(pl.Utf8).alias('_alarm_str')
+            ).lazy()
+            st.session_state.excel_bytes = get_excel_bytes(st.session_state.df_polars)
+            st.session_state.pop('tabular_view', None)
+            st.session_state.pop('pyg_app', None)
+            st.session_state.data_key = data_key
             st.success("✅ Data transformation complete!")
         except Exception as e:
             st.error(f"⚠️ An error occurred: {e}")
             st.stop()
 
     st.subheader("📌 Preview of Transformed Data")
-    st.dataframe(st.session_state.df_pandas.head(20), use_container_width=True)
-
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        st.session_state.df_pandas.to_excel(writer, index=False, sheet_name='Validated Tickets')
-    output.seek(0)
+    st.dataframe(st.session_state.df_polars.head(20), use_container_width=True)
 
     st.download_button(
         label="📥 Download as Excel",
-        data=output,
+        data=st.session_state.excel_bytes,
         file_name="validated_tickets.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
     # PIE CHART & TABULAR
-    df = st.session_state.df_pandas
+    df = st.session_state.df_polars
     tab_pie, tab_tabular, tab_valid = st.tabs(["PIE CHART", "AGGREGATED TABLE", "VALID ROWS"])
 
     if "VALIDATION" not in df.columns:
@@ -197,131 +298,67 @@ def main():
             st.warning("No `VALIDATION` column found. Make sure the pipeline creates it first.")
 
     else:
-        order = ["VALID", "INVALID", "NOT IN NMS"]
-        counts = (
-            df["VALIDATION"].value_counts(dropna=False)
-            .reindex(order)
-            .fillna(0)
-            .astype(int)
-        )
-
         with tab_pie:
             
             dark_mode = st.toggle("🌙 Dark Mode", value=False)
 
-            text_color = "white" if dark_mode else "black"
-            bg_color = "black" if dark_mode else "white"
-            grid_color = "#444" if dark_mode else "#ddd"
-
-            order = ["VALID", "INVALID", "NOT IN NMS"]
-            counts = (
-                df["VALIDATION"].value_counts(dropna=False)
-                .reindex(order)
-                .fillna(0)
-                .astype(int)
-            )
-            values = [int(counts.get(k, 0)) for k in order]
-
-            fig = px.pie(
-                names=order,
-                values=values,
-                hole=0,
-                color=order,
-                color_discrete_map={
-                    "VALID": "green",
-                    "INVALID": "orange",
-                    "NOT IN NMS": "blue"
-                }
-            )
-
-            fig.update_traces(
-                textinfo="label+percent",
-                textposition="inside",
-                insidetextfont=dict(size=14, color="white"),
-                hoverinfo="skip",
-                hovertemplate=None
-            )
-
-            fig.update_layout(
-                title=dict(
-                    text="Validation Distribution",
-                    x=0.5, y=0.95,
-                    xanchor="center",
-                    yanchor="top",
-                    font=dict(size=30, color=text_color, family="Arial")
-                ),
-                autosize=True,
-                height=560,
-                margin=dict(t=140, b=40, l=10, r=40),
-                legend=dict(orientation="v", y=1, x=0.61, xanchor="left", font=dict(color=text_color)
-
-                ),
-                paper_bgcolor=bg_color,
-                plot_bgcolor=bg_color
-                
-            )
-
-            for ann in fig.layout.annotations:
-                ann.font.color = text_color
-
-            fig.update_layout(annotations=[
-                dict(text=f"<span style='font-size:23px;'><b>VALID</b></span><br><br><span style='font-size:40px;'>{values[0]}</span>",
-                     x=0.25, y=1.22, xref="paper", yref="paper",
-                     showarrow=False, align="center", font=dict(size=16, color=text_color)),
-                dict(text=f"<span style='font-size:23px;'><b>INVALID</b></span><br><br><span style='font-size:40px;'>{values[1]}</span>",
-                     x=0.50, y=1.22, xref="paper", yref="paper",
-                     showarrow=False, align="center", font=dict(size=16, color=text_color)),
-                dict(text=f"<span style='font-size:23px;'><b>NOT IN NMS</b></span><br><br><span style='font-size:40px;'>{values[2]}</span>",
-                     x=0.75, y=1.22, xref="paper", yref="paper",
-                     showarrow=False, align="center", font=dict(size=16, color=text_color)),
-            ])
+            counts = st.session_state.validation_counts
+            values = tuple(int(counts.get(k, 0)) for k in VALIDATION_STATES)
+            fig = build_pie(values, dark_mode)
 
             st.plotly_chart(fig, use_container_width=True)
 
         with tab_tabular:
-            tabular = get_unique(df)
-
-            col1, col2, col3, col4 = st.columns([1.5, 1.5, 3, 1])
- 
-            with col1:
-                sort_column = st.selectbox(
-                "Sort by column:",
-                options=tabular.columns, 
-                index=0, 
-                label_visibility="visible"
-            )
+            tabular = st.session_state.tabular_pl
 
-            with col2:
-                sort_order = st.radio(
-                "Order:",
-                options=["Ascending", "Descending"],
-                horizontal=True
-            )
-            
-            with col3:
-                search_query = st.text_input(
-                "Search by Site code or Alarm Count:",
-                value="",
-                label_visibility="visible"
-            )
-                
-            with col4:
-                with st.container():
-                    st.markdown("<div style='padding-top: 1.8rem;'></div>", unsafe_allow_html=True)
-                    clear_search = st.button("Clear Search")
+            with st.form("tabular_controls", clear_on_submit=False):
+                col1, col2, col3, col4 = st.columns([1.5, 1.5, 3, 1])
 
-            if clear_search:
-                search_query = ""
+                with col1:
+                    sort_column = st.selectbox(
+                    "Sort by column:",
+                    options=[c for c in tabular.collect_schema().names() if not c.startswith('_')],
+                    index=0,
+                    label_visibility="visible"
+                )
 
-            if search_query:
-                search_query = search_query.strip().lower()
-                tabular = tabular[
-                    tabular["SITE CODE"].astype(str).str.lower().str.contains(search_query)
-                    | tabular["Alarm Count"].astype(str).str.contains(search_query)
-            ]
+                with col2:
+                    sort_order = st.radio(
+                    "Order:",
+                    options=["Ascending", "Descending"],
+                    horizontal=True
+                )
+
+                with col3:
+                    search_query = st.text_input(
+                    "Search by Site code or Alarm Count:",
+                    value="",
+                    key="search_query",
+                    label_visibility="visible"
+                )
+
+                with col4:
+                    with st.container():
+                        st.markdown("<div style='padding-top: 1.8rem;'></div>", unsafe_allow_html=True)
+                        apply_search = st.form_submit_button("Apply")
+                        clear_search = st.form_submit_button("Clear Search", on_click=clear_search_query)
+
+            if apply_search or clear_search or 'tabular_view' not in st.session_state:
+                if search_query:
+                    search_query = search_query.strip().lower()
+                    tabular = tabular.filter(
+                        pl.col("_site_lc").str.contains(search_query, literal=True)
+                        | pl.col("_alarm_str").str.contains(search_query, literal=True)
+                    )
+
+                ascending = sort_order == "Ascending"
+                st.session_state.tabular_view = (
+                    tabular.sort(sort_column, descending=not ascending, nulls_last=True)
+                    .drop('_site_lc', '_alarm_str')
+                    .collect()
+                )
 
-            ascending = sort_order == "Ascending"
-            sorted_tabular = tabular.sort_values(by=sort_column, ascending=ascending)
+            sorted_tabular = st.session_state.tabular_view
 
             fig = go.Figure(data=[go.Table(
                 header=dict(
@@ -331,7 +368,7 @@ def main():
                     font=dict(color="black", size=13)
                 ),
                 cells=dict(
-                    values=[sorted_tabular[col] for col in sorted_tabular.columns],
+                    values=[sorted_tabular[col].to_list() for col in sorted_tabular.columns],
                     align="center"
                 )
             )])
@@ -349,9 +386,11 @@ def main():
 
 
     st.markdown("---")
-    st.subheader("🧠 Explore Your Data (Interactive)")
-    pyg_app = StreamlitRenderer(st.session_state.df_pandas)
-    pyg_app.explorer()
+    with st.expander("🧠 Explore Your Data (Interactive)", expanded=False):
+        if st.toggle("Open Explorer", value=False, key="show_explorer"):
+            if 'pyg_app' not in st.session_state:
+                st.session_state.pyg_app = StreamlitRenderer(st.session_state.df_polars)
+            st.session_state.pyg_app.explorer()
 
 
 if __name__ == '__main__':